@@ -1,9 +1,17 @@
 import os
 from dotenv import load_dotenv
 
-load_dotenv()
+# Parse .env exactly once per process, even if this module ends up imported
+# under two names (sys.path contains both the repo root and src/).
+if not os.environ.get('_GOAL_HIGHLIGHTS_ENV_LOADED'):
+    load_dotenv()
+    os.environ['_GOAL_HIGHLIGHTS_ENV_LOADED'] = '1'
 
 # AWS Configuration
+# Credentials are resolved by boto3's provider chain (env vars, shared
+# credentials file, IAM role) — never hardcode keys here.
+AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
+S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME', 'goal-highlights')
 
 # Video Processing Configuration
 HIGHLIGHT_DURATION = 20  # Total duration in seconds
@@ -11,6 +19,7 @@ PRE_GOAL_DURATION = 10   # Seconds before goal
 POST_GOAL_DURATION = 10  # Seconds after goal
 
 # Goal Detection Configuration
+TARGET_FPS = 5  # Effective sampling rate for goal detection
 CONFIDENCE_THRESHOLD = 0.45
 NMS_THRESHOLD = 0.4
 GOAL_DETECTION_KEYWORDS = [
@@ -20,7 +29,7 @@ GOAL_DETECTION_KEYWORDS = [
 
 # Model Configuration
 MODEL_INPUT_SIZE = (640, 640)
-BATCH_SIZE = 1
+BATCH_SIZE = 16  # Frames per YOLO inference call
 
 # Output Configuration
 OUTPUT_FORMAT = 'mp4'
@@ -1,7 +1,9 @@
 import boto3
 import os
 import logging
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError, NoCredentialsError
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Optional
 import config
 
@@ -14,13 +16,21 @@ class AWSHandler:
     def __init__(self):
         """Initialize AWS S3 client."""
         try:
-            self.s3_client = boto3.client(
-                's3',
-                aws_access_key_id=config.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY,
-                region_name=config.AWS_REGION
-            )
+            # Let boto3 resolve credentials (env vars, shared credentials
+            # file, IAM role) so sessions and IMDS caching are reused.
+            self.s3_client = boto3.client('s3', region_name=config.AWS_REGION)
             self.bucket_name = config.S3_BUCKET_NAME
+            # Multipart uploads with several concurrent parts per file
+            self.transfer_config = TransferConfig(
+                multipart_threshold=8 * 1024 * 1024,
+                multipart_chunksize=8 * 1024 * 1024,
+                max_concurrency=10,
+                use_threads=True
+            )
+            self._extra_args = {
+                'ContentType': 'video/mp4',
+                'ServerSideEncryption': 'AES256'
+            }
             self._verify_credentials()
             
         except Exception as e:
@@ -101,10 +111,8 @@ class AWSHandler:
                 local_file_path,
                 self.bucket_name,
                 s3_key,
-                ExtraArgs={
-                    'ContentType': 'video/mp4',
-                    'ServerSideEncryption': 'AES256'
-                }
+                ExtraArgs=self._extra_args,
+                Config=self.transfer_config
             )
             
             # Generate URL for the uploaded file
@@ -122,24 +130,35 @@ class AWSHandler:
     
     def upload_multiple_files(self, file_paths: List[str]) -> List[str]:
         """
-        Upload multiple files to S3.
-        
+        Upload multiple files to S3 concurrently.
+
         Args:
             file_paths: List of local file paths
-            
+
         Returns:
             List[str]: List of successfully uploaded S3 keys
         """
         uploaded_files = []
-        
-        for file_path in file_paths:
-            filename = os.path.basename(file_path)
-            
-            if self.upload_file(file_path, filename):
-                uploaded_files.append(filename)
-            else:
-                logger.error(f"Failed to upload: {filename}")
-        
+
+        if not file_paths:
+            return uploaded_files
+
+        # Uploads are I/O-bound, so run them in parallel; boto3's S3 client
+        # is thread-safe for uploads.
+        with ThreadPoolExecutor(max_workers=min(8, len(file_paths))) as executor:
+            futures = {
+                executor.submit(self.upload_file, file_path, os.path.basename(file_path)): file_path
+                for file_path in file_paths
+            }
+
+            for future in as_completed(futures):
+                filename = os.path.basename(futures[future])
+
+                if future.result():
+                    uploaded_files.append(filename)
+                else:
+                    logger.error(f"Failed to upload: {filename}")
+
         logger.info(f"Successfully uploaded {len(uploaded_files)}/{len(file_paths)} files")
         return uploaded_files
     
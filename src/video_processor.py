@@ -1,34 +1,277 @@
-import cv2
 import numpy as np
-from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip
+from moviepy.editor import VideoFileClip
 import os
+import json
+import shutil
+import subprocess
+import tempfile
 import logging
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional
 import config
+from utils.video_utils import probe_video_stream
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class VideoProcessor:
+    # Streams at or below this bitrate are remuxed rather than re-encoded
+    MAX_UPLOAD_BITRATE = 8_000_000  # 8 Mbps
+
+    # Fixed goal-marker styling; only the timing window varies per goal
+    GOAL_MARKER_STYLE = (
+        "fontcolor=red:fontsize=50:borderw=2:bordercolor=white:"
+        "x=(w-tw)/2:y=(h-th)/2"
+    )
+
     def __init__(self):
         """Initialize video processor."""
         self.output_format = config.OUTPUT_FORMAT
         self.output_quality = config.OUTPUT_QUALITY
-        
-    def extract_highlight_clip(self, 
-                             video_path: str, 
-                             goal_timestamp: float, 
+        self._hw_encoder = self._detect_hw_encoder()
+
+    @staticmethod
+    def _get_duration(video_path: str) -> float:
+        """Source duration in seconds; probe_video_stream caches by path+mtime."""
+        try:
+            return probe_video_stream(video_path).get('duration', 0)
+        except Exception as e:
+            logger.error(f"Error probing video duration: {str(e)}")
+            return 0
+
+    @staticmethod
+    def _detect_hw_encoder() -> Optional[str]:
+        """Return the best *working* hardware H.264 encoder, if any."""
+        try:
+            result = subprocess.run(
+                ['ffmpeg', '-hide_banner', '-encoders'],
+                capture_output=True, text=True
+            )
+            for encoder in ('h264_nvenc', 'h264_videotoolbox', 'h264_qsv'):
+                if encoder not in result.stdout:
+                    continue
+                # Listed only means compiled in — stock builds advertise
+                # NVENC/QSV on machines without the GPU. Prove the encoder
+                # opens with a one-frame test encode before committing to it.
+                test = subprocess.run(
+                    ['ffmpeg', '-hide_banner', '-loglevel', 'error',
+                     '-f', 'lavfi', '-i', 'nullsrc=s=256x256:d=0.1',
+                     '-frames:v', '1', '-c:v', encoder, '-f', 'null', '-'],
+                    capture_output=True, text=True
+                )
+                if test.returncode == 0:
+                    logger.info(f"Using hardware video encoder: {encoder}")
+                    return encoder
+                logger.info(f"Hardware encoder {encoder} listed but not usable, skipping")
+        except Exception as e:
+            logger.warning(f"Could not probe ffmpeg encoders: {str(e)}")
+        return None
+
+    def _encode_args(self, quality: int) -> List[str]:
+        """
+        Video codec arguments for an ffmpeg call, preferring the probed
+        hardware encoder. `quality` is a CRF-style value (lower = better).
+        """
+        if self._hw_encoder == 'h264_nvenc':
+            return ['-c:v', 'h264_nvenc', '-preset', 'p4', '-rc', 'vbr', '-cq', str(quality)]
+        if self._hw_encoder:
+            # VideoToolbox/QSV quality knobs are encoder-specific; their
+            # defaults are fine for short clips.
+            return ['-c:v', self._hw_encoder]
+        # veryfast skips the subpel/RDO passes that dominate x264 cycles for
+        # a near-invisible quality delta; zerolatency suits single-pass clips.
+        return ['-c:v', 'libx264', '-preset', 'veryfast', '-tune', 'zerolatency',
+                '-crf', str(quality)]
+
+    @classmethod
+    def _drawtext_filter(cls, marker_start: float) -> str:
+        """drawtext filter showing the goal marker for 2 s from marker_start."""
+        return (
+            f"drawtext=text='GOAL!':"
+            f"enable='between(t,{marker_start:.2f},{marker_start + 2:.2f})':"
+            f"{cls.GOAL_MARKER_STYLE}"
+        )
+
+    @staticmethod
+    def _probe_keyframes(video_path: str, interval_start: float, interval_end: float) -> List[float]:
+        """Keyframe timestamps within [interval_start, interval_end]."""
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+             '-skip_frame', 'nokey', '-show_entries', 'frame=pts_time',
+             '-of', 'csv=p=0',
+             '-read_intervals', f'{interval_start:.3f}%{interval_end:.3f}',
+             video_path],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            return []
+
+        keyframes = []
+        for line in result.stdout.split():
+            try:
+                keyframes.append(float(line.strip().rstrip(',')))
+            except ValueError:
+                continue
+        return sorted(keyframes)
+
+    @staticmethod
+    def _match_source_encode_args(video_path: str) -> Optional[List[str]]:
+        """
+        Encoder arguments that make a re-encoded segment concat-compatible
+        with segments stream-copied from `video_path`, or None when the
+        source parameters can't be reproduced (caller should re-encode the
+        whole clip instead of stitching).
+        """
+        try:
+            result = subprocess.run(
+                ['ffprobe', '-v', 'error', '-show_entries',
+                 'stream=codec_type,codec_name,profile,level,pix_fmt,sample_rate,channels',
+                 '-of', 'json', video_path],
+                capture_output=True, text=True
+            )
+            streams = json.loads(result.stdout)['streams']
+        except Exception as e:
+            logger.warning(f"Could not probe stream parameters: {str(e)}")
+            return None
+
+        video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+        audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+
+        # The copied segments keep the source's extradata verbatim, so the
+        # encoded one must match it or the '-c copy' concat silently glitches.
+        if not video or video.get('codec_name') != 'h264':
+            return None
+        profile = (video.get('profile') or '').lower()
+        if profile not in ('baseline', 'main', 'high'):
+            return None
+
+        args = ['-profile:v', profile]
+        if video.get('level'):
+            args += ['-level', str(video['level'])]
+        if video.get('pix_fmt'):
+            args += ['-pix_fmt', video['pix_fmt']]
+
+        if audio is None:
+            args += ['-an']
+        elif audio.get('codec_name') == 'aac':
+            args += ['-c:a', 'aac']
+            if audio.get('sample_rate'):
+                args += ['-ar', str(audio['sample_rate'])]
+            if audio.get('channels'):
+                args += ['-ac', str(audio['channels'])]
+        else:
+            return None
+
+        return args
+
+    def _extract_marked_clip_segmented(self,
+                                       video_path: str,
+                                       start_time: float,
+                                       end_time: float,
+                                       marker_start: float,
+                                       output_path: str) -> bool:
+        """
+        Build a marked clip as [copied pre][re-encoded marker window][copied
+        post] stitched with the concat demuxer, so only the ~2 s under the
+        overlay pays for an encode. Returns False when keyframe boundaries
+        don't leave room for clean copy segments.
+        """
+        marker_abs_start = start_time + marker_start
+        marker_abs_end = marker_abs_start + 2
+
+        match_args = self._match_source_encode_args(video_path)
+        if match_args is None:
+            return False
+
+        keyframes = self._probe_keyframes(
+            video_path, max(0, start_time - 10), marker_abs_end + 10
+        )
+        starts = [k for k in keyframes if k <= start_time]
+        before = [k for k in keyframes if k <= marker_abs_start]
+        after = [k for k in keyframes if k >= marker_abs_end]
+        if not starts or not before or not after:
+            return False
+
+        # Every copy cut must both begin and end on a probed keyframe: a
+        # copy seek to a non-keyframe time silently pulls in the GOP from
+        # the preceding keyframe, shifting the segment so frames repeat
+        # across the concat joins. The clip therefore opens at the keyframe
+        # preceding start_time rather than at start_time itself.
+        kf_start = starts[-1]
+        seg_start, seg_end = before[-1], after[0]
+        if start_time - kf_start > 3.0:
+            # A sparse-keyframe source would stretch the clip head too far
+            return False
+        # Marker window touching a clip edge leaves no copy segment to save
+        if seg_start - kf_start <= 0.5 or seg_end >= end_time - 0.5:
+            return False
+
+        temp_dir = tempfile.mkdtemp(prefix='goal_segments_')
+        try:
+            segments = [
+                (os.path.join(temp_dir, 'pre.mp4'), kf_start, seg_start, None),
+                (os.path.join(temp_dir, 'mid.mp4'), seg_start, seg_end,
+                 self._drawtext_filter(marker_abs_start - seg_start)),
+                (os.path.join(temp_dir, 'post.mp4'), seg_end, end_time, None),
+            ]
+
+            # Seek targets are the probed pts values at full precision, so
+            # the value round-trips and each cut lands exactly on its
+            # keyframe; durations then measure from that keyframe, keeping
+            # both segment edges aligned.
+            for seg_path, seg_from, seg_to, drawtext in segments:
+                command = [
+                    'ffmpeg', '-y', '-loglevel', 'error',
+                    '-ss', f'{seg_from:.6f}', '-i', video_path,
+                    '-t', f'{seg_to - seg_from:.6f}'
+                ]
+                if drawtext:
+                    command += ['-vf', drawtext] + self._encode_args(20) + match_args
+                else:
+                    command += ['-c', 'copy', '-avoid_negative_ts', 'make_zero']
+                command.append(seg_path)
+
+                result = subprocess.run(command, capture_output=True, text=True)
+                if result.returncode != 0:
+                    logger.warning(f"Segment cut failed: {result.stderr.strip()}")
+                    return False
+
+            concat_list = os.path.join(temp_dir, 'segments.txt')
+            with open(concat_list, 'w') as f:
+                for seg_path, _, _, _ in segments:
+                    f.write(f"file '{seg_path}'\n")
+
+            result = subprocess.run(
+                ['ffmpeg', '-y', '-loglevel', 'error',
+                 '-f', 'concat', '-safe', '0', '-i', concat_list,
+                 '-c', 'copy', '-movflags', '+faststart', output_path],
+                capture_output=True, text=True
+            )
+            if result.returncode != 0:
+                logger.warning(f"Segment concat failed: {result.stderr.strip()}")
+                return False
+
+            return True
+
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def extract_highlight_clip(self,
+                             video_path: str,
+                             goal_timestamp: float,
                              output_path: str,
-                             mark_goal_moment: bool = True) -> bool:
+                             mark_goal_moment: bool = True,
+                             video_duration: Optional[float] = None) -> bool:
         """
         Extract highlight clip around goal moment.
-        
+
         Args:
             video_path: Path to input video
             goal_timestamp: Timestamp of goal in seconds
             output_path: Path for output clip
             mark_goal_moment: Whether to add visual marker at goal moment
-            
+            video_duration: Source duration if already known, to skip the probe
+
         Returns:
             bool: Success status
         """
@@ -36,155 +279,209 @@ class VideoProcessor:
             # Calculate clip boundaries
             start_time = max(0, goal_timestamp - config.PRE_GOAL_DURATION)
             end_time = goal_timestamp + config.POST_GOAL_DURATION
-            
+
+            # Check if end time exceeds video duration
+            duration = video_duration if video_duration else self._get_duration(video_path)
+            if duration and end_time > duration:
+                end_time = duration
+                logger.warning(f"Adjusted end time to video duration: {end_time:.2f}s")
+
             logger.info(f"Extracting clip from {start_time:.2f}s to {end_time:.2f}s")
-            
-            # Load video clip
-            with VideoFileClip(video_path) as video:
-                # Check if end time exceeds video duration
-                if end_time > video.duration:
-                    end_time = video.duration
-                    logger.warning(f"Adjusted end time to video duration: {end_time:.2f}s")
-                
-                # Extract subclip
-                highlight_clip = video.subclip(start_time, end_time)
-                
-                # Add goal moment marker if requested
-                if mark_goal_moment:
-                    highlight_clip = self.add_goal_marker(
-                        highlight_clip, 
-                        goal_timestamp - start_time  # Relative timestamp in clip
-                    )
-                
-                # Write output with compression
-                highlight_clip.write_videofile(
-                    output_path,
-                    codec='libx264',
-                    audio_codec='aac',
-                    temp_audiofile='temp-audio.m4a',
-                    remove_temp=True,
-                    preset='medium',
-                    ffmpeg_params=['-crf', '23']  # Good quality with reasonable file size
-                )
-                
+
+            # -ss before -i seeks to the nearest keyframe without decoding
+            # the whole match; only the clip window is ever touched.
+            command = [
+                'ffmpeg', '-y', '-loglevel', 'error',
+                '-ss', f'{start_time:.3f}',
+                '-i', video_path,
+                '-t', f'{end_time - start_time:.3f}'
+            ]
+
+            if mark_goal_moment:
+                marker_start = max(0, goal_timestamp - start_time - 1)
+
+                # Prefer stitching stream-copied segments around a tiny
+                # re-encoded marker window; fall back to re-encoding the
+                # whole clip when no usable keyframe boundaries exist.
+                if self._extract_marked_clip_segmented(
+                        video_path, start_time, end_time, marker_start, output_path):
+                    logger.info(f"Successfully created highlight clip: {output_path}")
+                    return True
+
+                # Burn the marker in with drawtext over a full re-encode
+                command += ['-vf', self._drawtext_filter(marker_start)] \
+                    + self._encode_args(20) + ['-c:a', 'aac']
+            else:
+                # No overlay: pure stream copy, no decode or encode at all
+                command += ['-c', 'copy', '-avoid_negative_ts', 'make_zero']
+
+            command += ['-movflags', '+faststart', output_path]
+
+            result = subprocess.run(command, capture_output=True, text=True)
+            if result.returncode != 0:
+                logger.error(f"ffmpeg failed: {result.stderr.strip()}")
+                return False
+
             logger.info(f"Successfully created highlight clip: {output_path}")
             return True
-            
+
         except Exception as e:
             logger.error(f"Error creating highlight clip: {str(e)}")
             return False
     
-    def add_goal_marker(self, video_clip, goal_moment_relative: float):
-        """Add visual marker at the exact goal moment."""
-        try:
-            # Create text overlay for goal moment
-            goal_text = TextClip(
-                "⚽ GOAL! ⚽",
-                fontsize=50,
-                color='red',
-                font='Arial-Bold',
-                stroke_color='white',
-                stroke_width=2
-            ).set_position('center').set_duration(2)  # Show for 2 seconds
-            
-            # Position the text to appear at goal moment
-            goal_text = goal_text.set_start(max(0, goal_moment_relative - 1))
-            
-            # Composite video with text overlay
-            final_video = CompositeVideoClip([video_clip, goal_text])
-            
-            return final_video
-            
-        except Exception as e:
-            logger.warning(f"Could not add goal marker: {str(e)}")
-            return video_clip
-    
     def get_video_info(self, video_path: str) -> dict:
         """Get video information."""
         try:
-            cap = cv2.VideoCapture(video_path)
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            duration = frame_count / fps if fps > 0 else 0
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            cap.release()
-            
+            info = probe_video_stream(video_path)
+
             return {
-                'fps': fps,
-                'frame_count': frame_count,
-                'duration': duration,
-                'width': width,
-                'height': height
+                'fps': info['fps'],
+                'frame_count': info['frame_count'],
+                'duration': info['duration'],
+                'width': info['width'],
+                'height': info['height']
             }
         except Exception as e:
             logger.error(f"Error getting video info: {str(e)}")
             return {}
     
-    def create_multiple_highlights(self, 
-                                 video_path: str, 
-                                 goal_timestamps: List[float], 
+    def create_multiple_highlights(self,
+                                 video_path: str,
+                                 goal_timestamps: List[float],
                                  output_dir: str) -> List[str]:
-        """Create multiple highlight clips for all detected goals."""
+        """Create multiple highlight clips for all detected goals in parallel."""
         created_clips = []
-        
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        
+
+        if not goal_timestamps:
+            return created_clips
+
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Probe the source once here instead of once per goal in each worker
+        video_duration = self._get_duration(video_path)
+
+        jobs = []
         for i, goal_timestamp in enumerate(goal_timestamps):
             # Calculate minute of the goal for filename
             minute = int(goal_timestamp // 60)
-            
+
             # Create output filename
             output_filename = f"{config.OUTPUT_PREFIX}{minute:02d}_{i+1}.{config.OUTPUT_FORMAT}"
             output_path = os.path.join(output_dir, output_filename)
-            
-            # Extract clip
-            success = self.extract_highlight_clip(
-                video_path, 
-                goal_timestamp, 
-                output_path,
-                mark_goal_moment=True
-            )
-            
-            if success:
-                created_clips.append(output_path)
-                logger.info(f"Created highlight clip {i+1}/{len(goal_timestamps)}: {output_filename}")
-            else:
-                logger.error(f"Failed to create highlight clip for goal at {goal_timestamp:.2f}s")
-        
+            jobs.append((video_path, goal_timestamp, output_path, video_duration))
+
+        # One ffmpeg per goal writes an independent file. The Python side
+        # only spawns and waits on subprocesses, so threads are enough to
+        # keep several encodes in flight while clip N+1 seeks; cap workers
+        # at half the cores since each ffmpeg already uses several threads,
+        # and at the NVENC session limit when encoding on the GPU.
+        max_workers = min(len(jobs), max(1, (os.cpu_count() or 2) // 2))
+        if self._hw_encoder == 'h264_nvenc':
+            max_workers = min(max_workers, 3)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(
+                    self.extract_highlight_clip,
+                    job_video_path,
+                    job_timestamp,
+                    job_output_path,
+                    mark_goal_moment=True,
+                    video_duration=job_duration
+                ): (job_timestamp, job_output_path)
+                for job_video_path, job_timestamp, job_output_path, job_duration in jobs
+            }
+
+            for future in as_completed(futures):
+                goal_timestamp, output_path = futures[future]
+
+                if future.result():
+                    created_clips.append(output_path)
+                    logger.info(f"Created highlight clip: {os.path.basename(output_path)}")
+                else:
+                    logger.error(f"Failed to create highlight clip for goal at {goal_timestamp:.2f}s")
+
+        created_clips.sort()
         return created_clips
     
     def optimize_for_upload(self, video_path: str) -> str:
-        """Optimize video file for upload (compress if needed)."""
+        """Optimize video file for upload (remux or compress if needed)."""
         try:
-            # Check file size
-            file_size_mb = os.path.getsize(video_path) / (1024 * 1024)
-            
+            # Check file size (one stat, reused below)
+            file_size_mb = os.stat(video_path).st_size / (1024 * 1024)
+
             if file_size_mb > 50:  # If larger than 50MB, compress more
+                base_name = os.path.splitext(video_path)[0]
+
+                # Already-reasonable H.264 only needs the moov atom moved to
+                # the front for streaming — remux without any transcode.
+                try:
+                    info = probe_video_stream(video_path)
+                except Exception as e:
+                    logger.warning(f"Could not probe video stream: {str(e)}")
+                    info = {}
+                bit_rate = info.get('bit_rate', 0)
+                if info.get('codec') == 'h264' and 0 < bit_rate < self.MAX_UPLOAD_BITRATE:
+                    logger.info(f"Video file is {file_size_mb:.2f}MB but already "
+                                f"H.264 at {bit_rate / 1e6:.1f}Mbps, remuxing only")
+                    remuxed_path = f"{base_name}_faststart.mp4"
+                    result = subprocess.run(
+                        ['ffmpeg', '-y', '-loglevel', 'error', '-i', video_path,
+                         '-c', 'copy', '-movflags', '+faststart', remuxed_path],
+                        capture_output=True, text=True
+                    )
+                    if result.returncode == 0:
+                        os.replace(remuxed_path, video_path)
+                        return video_path
+                    logger.warning(f"Remux failed, falling back to transcode: {result.stderr.strip()}")
+
                 logger.info(f"Video file is {file_size_mb:.2f}MB, applying additional compression")
-                
+
                 # Create compressed version
-                base_name = os.path.splitext(video_path)[0]
                 compressed_path = f"{base_name}_compressed.mp4"
-                
+
+                # MoviePy's default thread count leaves most cores idle
+                encode_threads = max(2, (os.cpu_count() or 2) - 1)
+
                 with VideoFileClip(video_path) as video:
-                    video.write_videofile(
-                        compressed_path,
-                        codec='libx264',
-                        audio_codec='aac',
-                        temp_audiofile='temp-audio.m4a',
-                        remove_temp=True,
-                        preset='fast',
-                        ffmpeg_params=['-crf', '28']  # Higher compression
-                    )
+                    if self._hw_encoder == 'h264_nvenc':
+                        video.write_videofile(
+                            compressed_path,
+                            codec='h264_nvenc',
+                            audio_codec='aac',
+                            temp_audiofile='temp-audio.m4a',
+                            remove_temp=True,
+                            preset='p4',
+                            threads=encode_threads,
+                            verbose=False,
+                            logger=None,
+                            ffmpeg_params=['-rc', 'vbr', '-cq', '28']
+                        )
+                    else:
+                        # Frame-parallel x264 trades a sliver of RD quality
+                        # for near-linear core scaling
+                        video.write_videofile(
+                            compressed_path,
+                            codec='libx264',
+                            audio_codec='aac',
+                            temp_audiofile='temp-audio.m4a',
+                            remove_temp=True,
+                            preset='veryfast',
+                            threads=encode_threads,
+                            verbose=False,
+                            logger=None,
+                            ffmpeg_params=[
+                                '-crf', '26',  # Higher compression
+                                '-x264-params', f'sliced-threads=0:threads={encode_threads}'
+                            ]
+                        )
                 
                 # Replace original with compressed version
                 os.replace(compressed_path, video_path)
-                logger.info(f"Compressed video to {os.path.getsize(video_path) / (1024 * 1024):.2f}MB")
+                logger.info(f"Compressed video to {os.stat(video_path).st_size / (1024 * 1024):.2f}MB")
             
             return video_path
             
         except Exception as e:
             logger.error(f"Error optimizing video: {str(e)}")
-            return video_path 
\ No newline at end of file
+            return video_path
\ No newline at end of file